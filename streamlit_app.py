@@ -11,12 +11,17 @@ Upload an **`ig_posts_raw_mini.csv`**‑style file and the app will:
 **Tip:** The file‑upload control now lives in the left‑hand sidebar under *“📂 Upload CSV”*.
 """
 
-import re
-from typing import List, Dict
+from itertools import chain
+from typing import Iterator, List
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
 
+from tokenizer import tokenize_many
+
 # ----------  UI CONFIG  ---------- #
 st.set_page_config(
     page_title="Instagram Caption Pre‑processor",
@@ -34,72 +39,170 @@ st.markdown(
     """,
 )
 
-# ----------  TOKENIZER  ---------- #
-
-_SENTENCE_END_RE = re.compile(r"([.!?…])+")  # handles ellipses & repeated punctuation
-
-def instagram_sentence_tokenize(text: str) -> List[str]:
-    """Break a caption into sentences, respecting emojis/Instagram quirks."""
-    text = re.sub(r"\s+", " ", str(text).strip())  # normalize whitespace
-    if not text:
-        return []
-
-    parts = _SENTENCE_END_RE.split(text)
-    sentences: List[str] = []
-    for i in range(0, len(parts), 2):
-        sentence = parts[i]
-        if i + 1 < len(parts):
-            sentence += parts[i + 1]  # re‑attach delimiter(s)
-        sentence = sentence.strip()
-        if sentence:
-            sentences.append(sentence)
-    return sentences
-
 # ----------  CORE TRANSFORMATION  ---------- #
 
+_REQUIRED_COLS = {"shortcode", "caption"}
+# Bytes parsed per block when streaming an upload. Large enough that a full block
+# of typical captions reaches the parallel tokenizer, small enough to bound peak memory.
+_BLOCK_BYTES = 64 << 20
+# Column types of the downloadable CSV; every block is cast to this schema.
+_OUTPUT_SCHEMA = pa.schema(
+    [("ID", pa.string()), ("Context", pa.string()), ("Statement", pa.string()), ("Sentence ID", pa.int64())]
+)
+# Largest preview the sidebar slider can ask for.
+_MAX_PREVIEW_ROWS = 500
+# Captions longer than this are cut short in the preview (not in the download).
+_PREVIEW_CONTEXT_CHARS = 160
+# Uploads whose preview/validation results stay cached server-wide; these caches
+# are shared by every session, so keep them bounded.
+_CACHED_UPLOADS = 8
+
+def _check_columns(columns) -> None:
+    """Raise if the `shortcode`/`caption` columns are not all present."""
+    missing = _REQUIRED_COLS - set(columns)
+    if missing:
+        raise ValueError(f"Input CSV missing required column(s): {', '.join(sorted(missing))}")
+
 def preprocess(df: pd.DataFrame) -> pd.DataFrame:
     """Transform raw IG post data into the sentence‑level format."""
 
-    required_cols = {"shortcode", "caption"}
-    if not required_cols.issubset(df.columns):
-        missing = ", ".join(required_cols - set(df.columns))
-        raise ValueError(f"Input CSV missing required column(s): {missing}")
+    _check_columns(df.columns)
 
     df = df.rename(columns={"shortcode": "ID", "caption": "Context"})
 
-    records: List[Dict] = []
-    for _, row in df.iterrows():
-        post_id = row["ID"]
-        context = str(row["Context"])
-        for sent_idx, sentence in enumerate(instagram_sentence_tokenize(context), start=1):
-            records.append({
-                "ID": post_id,
-                "Context": context,
-                "Statement": sentence,
-                "Sentence ID": sent_idx,
-            })
-
-    return pd.DataFrame(records)
+    # Posts without a caption have no sentences; drop them before tokenizing.
+    df = df[df["Context"].notna()]
+    contexts = df["Context"].astype(str)
+    has_text = contexts.str.strip().ne("").to_numpy(dtype=bool)
+    ids, contexts = df["ID"].to_numpy()[has_text], contexts[has_text]
+
+    # Tokenize each distinct caption once; rows pick up their sentences via codes.
+    codes, uniques = pd.factorize(contexts)
+    unique_sentences = tokenize_many(uniques.tolist())
+    unique_counts = np.fromiter(map(len, unique_sentences), dtype=np.int64, count=len(uniques))
+    counts = unique_counts[codes]
+
+    # 0-based position of every output row within its post, plus where each
+    # distinct caption's sentences start in the flattened sentence array.
+    row_starts = np.repeat(counts.cumsum() - counts, counts)
+    within_post = np.arange(counts.sum()) - row_starts
+    flat_sentences = np.array(list(chain.from_iterable(unique_sentences)), dtype=object)
+    sentence_starts = unique_counts.cumsum() - unique_counts
+
+    # Build the output column-at-a-time instead of materialising a dict per row.
+    # ID and Context stay dictionary-encoded so each shortcode and caption is
+    # stored once however many sentences it has.
+    id_codes, id_uniques = pd.factorize(ids)
+    return pd.DataFrame(
+        {
+            "ID": pd.Categorical.from_codes(np.repeat(id_codes, counts), categories=id_uniques),
+            "Context": pd.Categorical.from_codes(np.repeat(codes, counts), categories=uniques),
+            "Statement": flat_sentences[np.repeat(sentence_starts[codes], counts) + within_post],
+            "Sentence ID": within_post + 1,
+        },
+        copy=False,
+    )
+
+def _open_csv(file_bytes: bytes) -> pacsv.CSVStreamingReader:
+    """Open a block-wise Arrow reader over the `shortcode`/`caption` columns."""
+    # Peek at the header first so a missing column gets our own error message.
+    header = pacsv.open_csv(
+        pa.BufferReader(file_bytes),
+        read_options=pacsv.ReadOptions(block_size=1 << 16),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+    )
+    _check_columns(header.schema.names)
+
+    return pacsv.open_csv(
+        pa.BufferReader(file_bytes),
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=_BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),  # multi-line captions
+        convert_options=pacsv.ConvertOptions(
+            include_columns=sorted(_REQUIRED_COLS),
+            column_types={col: pa.string() for col in _REQUIRED_COLS},
+        ),
+    )
+
+def _iter_processed(file_bytes: bytes) -> Iterator[pd.DataFrame]:
+    """Stream an upload through `preprocess`, one block at a time."""
+    reader = _open_csv(file_bytes)
+    empty = True
+    for batch in reader:
+        empty = False
+        yield preprocess(batch.to_pandas(types_mapper=pd.ArrowDtype))
+
+    if empty:  # header-only upload
+        yield preprocess(reader.schema.empty_table().to_pandas(types_mapper=pd.ArrowDtype))
+
+@st.cache_data(show_spinner=False, max_entries=_CACHED_UPLOADS)
+def validate_csv(file_bytes: bytes) -> int:
+    """Parse the whole upload without transforming it and return its post count.
+
+    The full transformation only runs when the download is clicked, outside the
+    page's error handling, so malformed rows must be caught here first.
+    """
+    return sum(batch.num_rows for batch in _open_csv(file_bytes))
+
+@st.cache_data(show_spinner=False, max_entries=_CACHED_UPLOADS)
+def build_preview(file_bytes: bytes) -> pd.DataFrame:
+    """Return the first `_MAX_PREVIEW_ROWS` sentence rows for display, reading only as far as needed."""
+    parts: List[pd.DataFrame] = []
+    n_rows = 0
+    for processed in _iter_processed(file_bytes):
+        parts.append(processed.head(_MAX_PREVIEW_ROWS - n_rows))
+        n_rows += len(parts[-1])
+        if n_rows >= _MAX_PREVIEW_ROWS:
+            break
+    preview = pd.concat(parts, ignore_index=True)
+
+    # The full caption repeats on every sentence row; trimming it keeps the
+    # payload sent to the browser small.
+    context = preview["Context"].astype(str)
+    too_long = context.str.len() > _PREVIEW_CONTEXT_CHARS
+    preview["Context"] = context.where(~too_long, context.str.slice(0, _PREVIEW_CONTEXT_CHARS) + "…")
+    return preview
+
+def to_csv_bytes(file_bytes: bytes) -> bytes:
+    """Transform the whole upload into CSV bytes for download.
+
+    Deliberately uncached: it only runs when the download is clicked, and a
+    server-wide cache would keep every upload's full CSV in memory.
+    """
+    # Arrow encodes UTF-8 straight into its own buffer, with no intermediate str.
+    sink = pa.BufferOutputStream()
+    with pacsv.CSVWriter(sink, _OUTPUT_SCHEMA) as writer:
+        for processed in _iter_processed(file_bytes):
+            writer.write_table(pa.Table.from_pandas(processed, preserve_index=False).cast(_OUTPUT_SCHEMA))
+    return sink.getvalue().to_pybytes()
 
 # ----------  SIDEBAR  ---------- #
 st.sidebar.header("⚙️ Options")
 
 uploaded_file = st.sidebar.file_uploader("📂 Upload CSV", type="csv", help="Must include 'shortcode' and 'caption' columns")
-max_rows = st.sidebar.slider("Max rows to display", min_value=10, max_value=500, value=100, step=10)
+max_rows = st.sidebar.slider("Max rows to display", min_value=10, max_value=_MAX_PREVIEW_ROWS, value=100, step=10)
 
 # ----------  MAIN WORKFLOW  ---------- #
 
 if uploaded_file is not None:
     try:
-        raw_df = pd.read_csv(uploaded_file)
-        processed_df = preprocess(raw_df)
-
-        st.success("✅ Processing complete! Preview below.")
-        st.dataframe(processed_df.head(max_rows), use_container_width=True, height=600)
+        file_bytes = uploaded_file.getvalue()
+        # Keep this upload's preview in the session so widget reruns (e.g. the
+        # slider) only re-slice it, without re-hashing the file for the cache.
+        if st.session_state.get("preview_file_id") != uploaded_file.file_id:
+            st.session_state["n_posts"] = validate_csv(file_bytes)
+            st.session_state["preview_df"] = build_preview(file_bytes)
+            st.session_state["preview_file_id"] = uploaded_file.file_id
+        preview_df = st.session_state["preview_df"]
+
+        st.success(
+            f"✅ Read {st.session_state['n_posts']:,} posts. Preview below; "
+            "the full CSV is built when you download it."
+        )
+        st.dataframe(preview_df.head(max_rows), use_container_width=True, height=600)
 
         st.download_button(
             label="💾 Download transformed CSV",
-            data=processed_df.to_csv(index=False).encode("utf‑8"),
+            data=lambda: to_csv_bytes(file_bytes),  # only built when clicked
             file_name="ig_posts_transformed.csv",
             mime="text/csv",
         )
@@ -0,0 +1,59 @@
+"""
+Instagram‑aware sentence tokenizer.
+
+Kept apart from the Streamlit page so worker processes can import it by a
+stable module name without running the app.
+"""
+
+import atexit
+import multiprocessing as mp
+import os
+import re
+import sys
+import threading
+from multiprocessing.pool import Pool
+from typing import List, Optional
+
+# A sentence runs up to the first run of terminal punctuation (keeps "!!!" and "…"
+# intact) or to the end of the caption.
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?…]+|$)")
+
+# Below this many distinct captions, shipping captions to the (already running)
+# workers costs more than tokenizing them in-process (~7µs each serially, ~5µs
+# each of pickling overhead through the pool). A full 64 MiB upload block of
+# typical captions (a few hundred bytes each) holds well over this many.
+_PARALLEL_MIN_CAPTIONS = 20_000
+
+_pool: Optional[Pool] = None
+_pool_lock = threading.Lock()
+
+def instagram_sentence_tokenize(text: str) -> List[str]:
+    """Break a caption into sentences, respecting emojis/Instagram quirks."""
+    text = " ".join(str(text).split())  # normalize whitespace
+    return _SENTENCE_RE.findall(text)
+
+def _get_pool(workers: int) -> Pool:
+    """Start the shared worker pool on first use and reuse it afterwards."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers re-run whatever `__main__` is when they start; under
+            # Streamlit that is the page script. Point them at this module while the
+            # pool starts. The lock keeps concurrent downloads from interleaving swaps.
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = sys.modules[__name__]
+            try:
+                _pool = mp.get_context("spawn").Pool(workers)
+            finally:
+                sys.modules["__main__"] = main
+            atexit.register(_pool.terminate)
+        return _pool
+
+def tokenize_many(captions: List[str]) -> List[List[str]]:
+    """Tokenize many captions, fanning out to worker processes for large uploads."""
+    workers = os.cpu_count() or 1
+    if workers < 2 or len(captions) < _PARALLEL_MIN_CAPTIONS:
+        return [instagram_sentence_tokenize(c) for c in captions]
+
+    chunksize = max(64, len(captions) // (workers * 4))
+    return _get_pool(workers).map(instagram_sentence_tokenize, captions, chunksize=chunksize)